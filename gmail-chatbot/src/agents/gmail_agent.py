@@ -1,7 +1,15 @@
 from typing import TypedDict, Annotated, List
 from langgraph.graph import StateGraph, END
 from langchain_core.messages import BaseMessage
+import asyncio
+import functools
 import json
+import re
+
+try:
+    import ahocorasick  # pyahocorasick: matcher multi-palavra em uma passada
+except ImportError:
+    ahocorasick = None
 
 class AgentState(TypedDict):
     messages: Annotated[List[BaseMessage], "Lista de mensagens da conversa"]
@@ -11,85 +19,142 @@ class AgentState(TypedDict):
     formatted_response: str  # Resposta final formatada
 
 
-def analyze_intent(state: AgentState) -> AgentState:
+# Palavras-chave e a intenção correspondente
+INTENT_KEYWORDS = {
+    "últimos": "recent_emails",
+    "recentes": "recent_emails",
+    "não lidos": "unread_emails",
+    "unread": "unread_emails",
+    "de:": "search_by_sender",
+    "from:": "search_by_sender",
+    "assunto": "search_by_subject",
+    "subject:": "search_by_subject",
+}
+
+# Regex compilada uma vez: os grupos nomeados correspondem às intenções,
+# então uma única varredura da query classifica todas as palavras-chave
+INTENT_RE = re.compile(
+    r"(?P<recent_emails>últimos|recentes)"
+    r"|(?P<unread_emails>não lidos|unread)"
+    r"|(?P<search_by_sender>de:|from:)"
+    r"|(?P<search_by_subject>assunto|subject:)",
+    re.IGNORECASE
+)
+
+# Autômato Aho-Corasick: casa todas as palavras-chave em uma única passada
+# linear da query, independente do tamanho do vocabulário
+if ahocorasick is not None:
+    INTENT_AUTOMATON = ahocorasick.Automaton()
+    for _keyword, _intent in INTENT_KEYWORDS.items():
+        INTENT_AUTOMATON.add_word(_keyword, _intent)
+    INTENT_AUTOMATON.make_automaton()
+else:
+    INTENT_AUTOMATON = None
+
+
+@functools.lru_cache(maxsize=512)
+def _classify(query_lower: str) -> str:
+    """Classifica a intenção de uma query já em minúsculas
+
+    Função pura e sem estado, então o lru_cache é seguro: queries
+    repetidas verbatim viram um lookup O(1) em vez de nova varredura.
+    """
+    if INTENT_AUTOMATON is not None:
+        for _, intent in INTENT_AUTOMATON.iter(query_lower):
+            return intent
+        return "general_search"
+
+    # Fallback sem pyahocorasick: varredura única via regex
+    match = INTENT_RE.search(query_lower)
+    return match.lastgroup if match else "general_search"
+
+
+async def analyze_intent(state: AgentState) -> AgentState:
     """Analisa a intenção do usuário - que tipo de busca no Gmail fazer"""
-    query = state["user_query"].lower()
-    
-    # Lógica simples para determinar intenção
-    if "últimos" in query or "recentes" in query:
-        intent = "recent_emails"
-    elif "não lidos" in query or "unread" in query:
-        intent = "unread_emails"
-    elif "de:" in query or "from:" in query:
-        intent = "search_by_sender"
-    elif "assunto" in query or "subject:" in query:
-        intent = "search_by_subject"
-    else:
-        intent = "general_search"
-    
-    state["intent"] = intent
+    state["intent"] = _classify(state["user_query"].lower())
     return state
 
-def search_gmail(state: AgentState) -> AgentState:
-    """Busca dados no Gmail usando MCP (placeholder por enquanto)"""
-    intent = state["intent"]
-    
-    # Por enquanto vamos simular dados do Gmail
-    mock_gmail_data = {
-        "recent_emails": {
-            "count": 5,
-            "emails": [
-                {"from": "joão@example.com", "subject": "Reunião amanhã", "date": "2025-09-13"},
-                {"from": "maria@example.com", "subject": "Relatório mensal", "date": "2025-09-12"}
-            ]
-        },
-        "unread_emails": {
-            "count": 3,
-            "emails": [
-                {"from": "sistema@bank.com", "subject": "Extrato disponível", "date": "2025-09-13"}
-            ]
-        }
+# Tabela de despacho: intenção -> corrotina do cliente MCP.
+# Um lookup no dict substitui a cadeia de if/elif e permite reunir
+# buscas de intenções diferentes concorrentemente.
+GMAIL_HANDLERS = {
+    "recent_emails": lambda client, query: client.get_recent_emails(count=5),
+    "unread_emails": lambda client, query: client.get_unread_emails(count=10),
+    "search_by_sender": lambda client, query: client.search_emails(query=query, count=10),
+    "search_by_subject": lambda client, query: client.search_emails(query=query, count=10),
+    "general_search": lambda client, query: client.search_emails(query=query, count=10),
+}
+
+# Dados simulados usados quando não há cliente MCP conectado
+_MOCK_GMAIL_DATA = {
+    "recent_emails": {
+        "count": 5,
+        "emails": [
+            {"from": "joão@example.com", "subject": "Reunião amanhã", "date": "2025-09-13"},
+            {"from": "maria@example.com", "subject": "Relatório mensal", "date": "2025-09-12"}
+        ]
+    },
+    "unread_emails": {
+        "count": 3,
+        "emails": [
+            {"from": "sistema@bank.com", "subject": "Extrato disponível", "date": "2025-09-13"}
+        ]
     }
-    
-    # Simula busca baseada na intenção
-    if intent in mock_gmail_data:
-        state["gmail_data"] = mock_gmail_data[intent]
-    else:
-        state["gmail_data"] = {"count": 0, "emails": [], "message": "Nenhum email encontrado"}
-    
-    return state
+}
+
+_EMPTY_RESULT = {"count": 0, "emails": [], "message": "Nenhum email encontrado"}
 
-def format_response(state: AgentState) -> AgentState:
+async def format_response(state: AgentState) -> AgentState:
     """Formata a resposta de forma legível para o usuário"""
     gmail_data = state["gmail_data"]
-    
-    if gmail_data["count"] == 0:
+
+    if gmail_data.get("count", 0) == 0:
         response = "Não encontrei emails com esses critérios."
     else:
-        response = f"Encontrei {gmail_data['count']} email(s):\n\n"
-        
+        # Acumula em lista e junta uma vez: O(n) em vez de O(n²)
+        # das concatenações repetidas com +=
+        parts = [f"Encontrei {gmail_data['count']} email(s):\n\n"]
+
         for email in gmail_data["emails"]:
-            response += f"• **De:** {email['from']}\n"
-            response += f"  **Assunto:** {email['subject']}\n"
-            response += f"  **Data:** {email['date']}\n\n"
-    
+            parts.append(
+                f"• **De:** {email['from']}\n"
+                f"  **Assunto:** {email['subject']}\n"
+                f"  **Data:** {email['date']}\n\n"
+            )
+
+        response = "".join(parts)
+
     state["formatted_response"] = response
     return state
 
 class GmailAgent:
-    def __init__(self, ollama_client):
+    def __init__(self, ollama_client, mcp_client=None):
         self.ollama_client = ollama_client
+        self.mcp_client = mcp_client  # GmailMCPClient já conectado (ou None)
         self.graph = self._build_graph()
-    
+
+    async def search_gmail(self, state: AgentState) -> AgentState:
+        """Busca dados no Gmail via MCP (ou dados simulados sem cliente)"""
+        intent = state["intent"]
+
+        # Sem cliente MCP conectado: mantém o mock para testes locais
+        if self.mcp_client is None:
+            state["gmail_data"] = _MOCK_GMAIL_DATA.get(intent, _EMPTY_RESULT)
+            return state
+
+        handler = GMAIL_HANDLERS.get(intent, GMAIL_HANDLERS["general_search"])
+        state["gmail_data"] = await handler(self.mcp_client, state["user_query"])
+        return state
+
     def _build_graph(self):
         """Constrói o grafo do agente com LangGraph"""
-        
+
         # Criar o grafo
         workflow = StateGraph(AgentState)
-        
+
         # Adicionar nós (estados)
         workflow.add_node("analyze", analyze_intent)
-        workflow.add_node("search", search_gmail)
+        workflow.add_node("search", self.search_gmail)
         workflow.add_node("format", format_response)
         
         # Definir o fluxo (edges)
@@ -100,9 +165,9 @@ class GmailAgent:
         
         return workflow.compile()
     
-    def process_query(self, user_query: str) -> str:
+    async def process_query(self, user_query: str) -> str:
         """Processa uma pergunta do usuário sobre Gmail"""
-        
+
         # Estado inicial
         initial_state = {
             "messages": [],
@@ -111,31 +176,61 @@ class GmailAgent:
             "gmail_data": {},
             "formatted_response": ""
         }
-        
-        # Executar o grafo
-        result = self.graph.invoke(initial_state)
-        
+
+        # Executar o grafo (nós async rodam no event loop,
+        # permitindo processar várias queries concorrentemente)
+        result = await self.graph.ainvoke(initial_state)
+
         return result["formatted_response"]
 
-if __name__ == "__main__":
+    async def aclose(self):
+        """Encerra a sessão MCP mantida pelo agente"""
+        if self.mcp_client is not None:
+            await self.mcp_client.disconnect()
+            self.mcp_client = None
+
+async def main():
+    """Testa o agente com várias perguntas concorrentes"""
     # Importa nosso cliente Ollama
     import sys
     import os
     sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'llm'))
     from ollama_client import OllamaClient
-    
-    # Criar agente
+    from gmail_client import GmailMCPClient
+
     ollama = OllamaClient()
-    agent = GmailAgent(ollama)
-    
-    # Testar diferentes tipos de pergunta
-    test_queries = [
-        "Quais são meus últimos emails?",
-        "Quantos emails não lidos eu tenho?",
-        "Me mostre emails recentes"
-    ]
-    
-    for query in test_queries:
-        print(f"\n Pergunta: {query}")
-        response = agent.process_query(query)
-        print(f"Resposta: {response}")
\ No newline at end of file
+
+    # Conecta o cliente MCP uma única vez: a mesma sessão (e o mesmo
+    # subprocesso do servidor) atende todas as queries do agente
+    mcp_client = GmailMCPClient()
+    if not await mcp_client.connect():
+        # Fecha transporte/subprocesso que a conexão parcial possa ter
+        # aberto antes de descartar o cliente
+        await mcp_client.disconnect()
+        mcp_client = None  # sem conexão, o agente usa dados simulados
+
+    # Criar agente com a sessão já conectada
+    agent = GmailAgent(ollama, mcp_client=mcp_client)
+
+    try:
+        # Testar diferentes tipos de pergunta
+        test_queries = [
+            "Quais são meus últimos emails?",
+            "Quantos emails não lidos eu tenho?",
+            "Me mostre emails recentes"
+        ]
+
+        # As queries rodam concorrentemente: o tempo total é ~o da mais lenta
+        responses = await asyncio.gather(
+            *(agent.process_query(query) for query in test_queries)
+        )
+
+        for query, response in zip(test_queries, responses):
+            print(f"\n Pergunta: {query}")
+            print(f"Resposta: {response}")
+
+    finally:
+        await agent.aclose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
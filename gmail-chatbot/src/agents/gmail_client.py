@@ -7,10 +7,18 @@ import json
 from typing import Dict, List, Any, Optional
 from contextlib import AsyncExitStack
 
+try:
+    import orjson  # parse JSON ~3-5x mais rápido das respostas MCP
+except ImportError:
+    orjson = None
+
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
 import mcp.types as types
 
+# Parser usado nas respostas do servidor MCP
+_loads = orjson.loads if orjson is not None else json.loads
+
 class GmailMCPClient:
     """Cliente MCP que se conecta ao servidor Gmail MCP via stdio"""
     
@@ -78,7 +86,7 @@ class GmailMCPClient:
             # Extrair resposta do MCP
             if result.content and len(result.content) > 0:
                 response_text = result.content[0].text
-                return json.loads(response_text)
+                return _loads(response_text)
             else:
                 return {"error": "Resposta vazia do servidor MCP"}
                 
@@ -98,7 +106,7 @@ class GmailMCPClient:
             
             if result.content and len(result.content) > 0:
                 response_text = result.content[0].text
-                return json.loads(response_text)
+                return _loads(response_text)
             else:
                 return {"error": "Resposta vazia do servidor MCP"}
                 
@@ -118,7 +126,7 @@ class GmailMCPClient:
             
             if result.content and len(result.content) > 0:
                 response_text = result.content[0].text
-                return json.loads(response_text)
+                return _loads(response_text)
             else:
                 return {"error": "Resposta vazia do servidor MCP"}
                 
@@ -138,7 +146,7 @@ class GmailMCPClient:
             
             if result.content and len(result.content) > 0:
                 response_text = result.content[0].text
-                return json.loads(response_text)
+                return _loads(response_text)
             else:
                 return {"error": "Resposta vazia do servidor MCP"}
                 
@@ -1,27 +1,70 @@
 import requests
 import json
+import hashlib
+from collections import OrderedDict
 from typing import Optional, Dict, Any
 import time
 
+try:
+    # Cache semântico opcional: embeddings locais + busca por cosseno
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    np = None
+    SentenceTransformer = None
+
+# Modelo local pequeno para embeddings do cache semântico
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Similaridade de cosseno mínima para considerar duas perguntas equivalentes
+SEMANTIC_THRESHOLD = 0.92
+
+# Limite de entradas do cache (eviction LRU)
+CACHE_MAX_ENTRIES = 1024
+
+# Prompt de sistema estável (byte a byte) entre requisições: prefixo
+# idêntico permite ao Ollama reaproveitar o KV cache do modelo
+SYSTEM_PROMPT = (
+    "Você é um assistente de emails que responde perguntas sobre a caixa "
+    "de entrada do Gmail do usuário. Responda sempre em português, de "
+    "forma objetiva e baseada apenas nos dados fornecidos."
+)
+
+# Mantém modelo e KV cache carregados entre chamadas
+KEEP_ALIVE = "30m"
+
 class OllamaClient:
     def __init__(self, base_url: str = "http://localhost:11434", model: str = "llama3.1:8b"):
         self.base_url = base_url
         self.model = model
         self.context = []  # Para manter conversação
-    
-    def generate(self, prompt: str, stream: bool = False) -> Dict[str, Any]:
-        """Gera resposta usando a API do Ollama"""
+        # Sessão persistente: reusa a conexão keep-alive com o Ollama
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        # Cache L1 (hash exato) e L2 (embeddings) de respostas do chat
+        self._exact_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._semantic_cache = []  # Lista de (embedding normalizado, resposta)
+        self._embedder = None  # Carregado sob demanda (modelo é pesado)
+
+    def generate(self, prompt: str, system_prompt: str = SYSTEM_PROMPT, stream: bool = False) -> Dict[str, Any]:
+        """Gera resposta usando a API do Ollama
+
+        O prompt de sistema vai separado no campo "system" para que o
+        prefixo estável seja cacheado pelo Ollama entre requisições.
+        """
         url = f"{self.base_url}/api/generate"
-        
+
         payload = {
             "model": self.model,
+            "system": system_prompt,
             "prompt": prompt,
             "stream": stream,
-            "context": self.context  # Mantém contexto da conversa
+            "context": self.context,  # Mantém contexto da conversa
+            "keep_alive": KEEP_ALIVE  # Evita descarregar modelo + KV cache
         }
         
         try:
-            response = requests.post(url, json=payload, timeout=120)
+            response = self.session.post(url, json=payload, timeout=120)
             response.raise_for_status()
             
             result = response.json()
@@ -35,14 +78,113 @@ class OllamaClient:
         except requests.exceptions.RequestException as e:
             return {"error": f"Erro na API Ollama: {str(e)}"}
 
+    def generate_stream(self, prompt: str, system_prompt: str = SYSTEM_PROMPT):
+        """Gera resposta em streaming, produzindo tokens conforme chegam
+
+        Reduz o tempo até o primeiro token: em vez de esperar a resposta
+        inteira, cada linha JSON do Ollama é decodificada e emitida na hora.
+        """
+        url = f"{self.base_url}/api/generate"
+
+        payload = {
+            "model": self.model,
+            "system": system_prompt,
+            "prompt": prompt,
+            "stream": True,
+            "context": self.context,
+            "keep_alive": KEEP_ALIVE
+        }
+
+        try:
+            with self.session.post(url, json=payload, timeout=120, stream=True) as response:
+                response.raise_for_status()
+
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+
+                    chunk = json.loads(line)
+
+                    # O último chunk traz o contexto atualizado da conversa
+                    if "context" in chunk:
+                        self.context = chunk["context"]
+
+                    if chunk.get("response"):
+                        yield chunk["response"]
+
+        except requests.exceptions.RequestException as e:
+            yield f"Erro na API Ollama: {str(e)}"
+
+    def chat_stream(self, message: str):
+        """Interface de chat em streaming (gerador de tokens)"""
+        yield from self.generate_stream(message)
+
     def chat(self, message: str) -> str:
-        """Interface simplificada para chat"""
+        """Interface simplificada para chat, com cache de respostas
+
+        L1: hash exato da mensagem (hit em microssegundos).
+        L2: similaridade de cosseno entre embeddings, para pegar
+        paráfrases que o cache exato perderia.
+        """
+        key = hashlib.sha1(message.encode()).hexdigest()
+
+        # L1: mensagem idêntica já respondida
+        if key in self._exact_cache:
+            self._exact_cache.move_to_end(key)
+            return self._exact_cache[key]
+
+        # L2: pergunta semanticamente equivalente
+        embedding = self._embed(message)
+        cached = self._semantic_lookup(embedding)
+        if cached is not None:
+            return cached
+
         result = self.generate(message)
-        
+
         if "error" in result:
             return f"Erro: {result['error']}"
-        
-        return result.get("response", "Sem resposta")
+
+        response = result.get("response", "Sem resposta")
+        self._cache_store(key, embedding, response)
+        return response
+
+    def _embed(self, text: str):
+        """Calcula o embedding normalizado do texto (None se indisponível)"""
+        if SentenceTransformer is None:
+            return None
+
+        if self._embedder is None:
+            self._embedder = SentenceTransformer(EMBEDDING_MODEL)
+
+        vector = self._embedder.encode(text)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _semantic_lookup(self, embedding) -> Optional[str]:
+        """Busca resposta cacheada com similaridade acima do limiar"""
+        if embedding is None or not self._semantic_cache:
+            return None
+
+        # Embeddings normalizados: cosseno vira produto escalar
+        similarities = np.stack(
+            [cached_emb for cached_emb, _ in self._semantic_cache]
+        ) @ embedding
+        best = int(np.argmax(similarities))
+
+        if similarities[best] > SEMANTIC_THRESHOLD:
+            return self._semantic_cache[best][1]
+        return None
+
+    def _cache_store(self, key: str, embedding, response: str):
+        """Guarda a resposta nos dois níveis, com eviction LRU"""
+        self._exact_cache[key] = response
+        if len(self._exact_cache) > CACHE_MAX_ENTRIES:
+            self._exact_cache.popitem(last=False)
+
+        if embedding is not None:
+            self._semantic_cache.append((embedding, response))
+            if len(self._semantic_cache) > CACHE_MAX_ENTRIES:
+                self._semantic_cache.pop(0)
     
     def reset_context(self):
         """Limpa o contexto da conversa"""
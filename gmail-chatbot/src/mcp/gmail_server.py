@@ -3,12 +3,19 @@
 Servidor MCP real para Gmail usando o SDK oficial do Model Context Protocol
 """
 import asyncio
+import hashlib
 import json
 import os
-import pickle
+import time
+from collections import deque
 from typing import Any, Dict, List
 import base64
 
+try:
+    import orjson  # serialização JSON ~3-5x mais rápida, direto em bytes
+except ImportError:
+    orjson = None
+
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -21,82 +28,125 @@ from mcp.server import NotificationOptions, Server
 # Configurações do Gmail
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
+
+def _dumps(result: Dict[str, Any]) -> str:
+    """Serializa uma resposta de ferramenta em JSON indentado"""
+    if orjson is not None:
+        return orjson.dumps(
+            result, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+        ).decode()
+    return json.dumps(result, indent=2, ensure_ascii=False)
+
+# Limite de requisições por lote da API do Gmail
+BATCH_SIZE = 100
+
+# Headers solicitados nas buscas em lote
+METADATA_HEADERS = ['From', 'To', 'Subject', 'Date']
+
+# Headers aproveitados ao parsear mensagens (frozenset: membership O(1))
+_WANTED_HEADERS = frozenset(('from', 'to', 'subject', 'date'))
+
+# Limite de buscas simultâneas no fallback concorrente (rate limit do Gmail)
+MAX_CONCURRENT_FETCHES = 10
+
+# TTL do cache de respostas por ferramenta (segundos)
+CACHE_TTL_DEFAULT = 60.0
+CACHE_TTLS = {
+    "get_email_details": 3600.0,  # detalhes de um email não mudam
+}
+
 class GmailMCPServer:
     def __init__(self):
         self.service = None
         self.server = Server("gmail-mcp-server")
+        # Cache de respostas: chave -> (timestamp, texto serializado)
+        self._cache: Dict[str, tuple] = {}
+        # Garante que só uma corrotina executa o fluxo OAuth/discovery
+        self._init_lock = asyncio.Lock()
         self._setup_tools()
     
     def _setup_tools(self):
         """Registra as ferramentas MCP disponíveis"""
-        
-        @self.server.list_tools()
-        async def handle_list_tools() -> list[types.Tool]:
-            """Lista todas as ferramentas disponíveis no servidor MCP"""
-            return [
-                types.Tool(
-                    name="get_recent_emails",
-                    description="Busca emails recentes da caixa de entrada",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "count": {
-                                "type": "integer",
-                                "description": "Número de emails para buscar (padrão: 5)",
-                                "default": 5
-                            }
+
+        # Constrói os descritores uma única vez: list_tools é consultado
+        # com frequência e a lista nunca muda em runtime
+        self._tools_cache = [
+            types.Tool(
+                name="get_recent_emails",
+                description="Busca emails recentes da caixa de entrada",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "count": {
+                            "type": "integer",
+                            "description": "Número de emails para buscar (padrão: 5)",
+                            "default": 5
                         }
                     }
-                ),
-                types.Tool(
-                    name="get_unread_emails", 
-                    description="Busca emails não lidos",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "count": {
-                                "type": "integer", 
-                                "description": "Número máximo de emails não lidos (padrão: 10)",
-                                "default": 10
-                            }
+                }
+            ),
+            types.Tool(
+                name="get_unread_emails", 
+                description="Busca emails não lidos",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "count": {
+                            "type": "integer", 
+                            "description": "Número máximo de emails não lidos (padrão: 10)",
+                            "default": 10
                         }
                     }
-                ),
-                types.Tool(
-                    name="search_emails",
-                    description="Busca emails usando query do Gmail",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "query": {
-                                "type": "string",
-                                "description": "Query de busca do Gmail (ex: 'from:pessoa@email.com', 'subject:reunião')"
-                            },
-                            "count": {
-                                "type": "integer",
-                                "description": "Número máximo de emails para retornar (padrão: 10)",
-                                "default": 10
-                            }
+                }
+            ),
+            types.Tool(
+                name="search_emails",
+                description="Busca emails usando query do Gmail",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "Query de busca do Gmail (ex: 'from:pessoa@email.com', 'subject:reunião')"
                         },
-                        "required": ["query"]
-                    }
-                ),
-                types.Tool(
-                    name="get_email_details",
-                    description="Busca detalhes completos de um email específico",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "message_id": {
-                                "type": "string",
-                                "description": "ID da mensagem no Gmail"
-                            }
-                        },
-                        "required": ["message_id"]
-                    }
-                )
-            ]
-        
+                        "count": {
+                            "type": "integer",
+                            "description": "Número máximo de emails para retornar (padrão: 10)",
+                            "default": 10
+                        }
+                    },
+                    "required": ["query"]
+                }
+            ),
+            types.Tool(
+                name="get_email_details",
+                description="Busca detalhes completos de um email específico",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "message_id": {
+                            "type": "string",
+                            "description": "ID da mensagem no Gmail"
+                        }
+                    },
+                    "required": ["message_id"]
+                }
+            ),
+            types.Tool(
+                name="refresh",
+                description="Limpa o cache de respostas para forçar novas buscas no Gmail",
+                inputSchema={
+                    "type": "object",
+                    "properties": {}
+                }
+            )
+        ]
+
+        @self.server.list_tools()
+        async def handle_list_tools() -> list[types.Tool]:
+            """Lista todas as ferramentas disponíveis no servidor MCP"""
+            return self._tools_cache
+
         @self.server.call_tool()
         async def handle_call_tool(
             name: str, arguments: dict[str, Any] | None
@@ -105,11 +155,28 @@ class GmailMCPServer:
             
             if not arguments:
                 arguments = {}
-            
-            # Inicializa Gmail se necessário
+
+            # Ferramenta de invalidação explícita do cache
+            if name == "refresh":
+                self._cache.clear()
+                result = {"tool": "refresh", "success": True, "message": "Cache limpo"}
+                return [types.TextContent(type="text", text=_dumps(result))]
+
+            # Verifica cache antes de ir à API (queries repetidas são comuns)
+            cache_key = hashlib.sha1(
+                f"{name}:{json.dumps(arguments, sort_keys=True)}".encode()
+            ).hexdigest()
+            cached = self._cache.get(cache_key)
+            if cached and time.time() - cached[0] < CACHE_TTLS.get(name, CACHE_TTL_DEFAULT):
+                return [types.TextContent(type="text", text=cached[1])]
+
+            # Inicializa Gmail se necessário (lock evita que chamadas
+            # concorrentes disparem o fluxo OAuth em duplicidade)
             if not self.service:
-                await self._initialize_gmail()
-            
+                async with self._init_lock:
+                    if not self.service:
+                        await self._initialize_gmail()
+
             try:
                 if name == "get_recent_emails":
                     count = arguments.get("count", 5)
@@ -126,53 +193,69 @@ class GmailMCPServer:
                     
                 elif name == "get_email_details":
                     message_id = arguments.get("message_id", "")
-                    result = await self._get_email_details(message_id)
+                    result = await self._get_email_full(message_id)
                     
                 else:
                     result = {"error": f"Ferramenta desconhecida: {name}"}
-                
-                return [types.TextContent(type="text", text=json.dumps(result, indent=2, ensure_ascii=False))]
+
+                text = _dumps(result)
+
+                # Guarda no cache apenas respostas bem-sucedidas
+                if 'error' not in result:
+                    self._cache[cache_key] = (time.time(), text)
+
+                return [types.TextContent(type="text", text=text)]
                 
             except Exception as e:
                 error_result = {"error": f"Erro ao executar {name}: {str(e)}"}
-                return [types.TextContent(type="text", text=json.dumps(error_result, indent=2))]
+                return [types.TextContent(type="text", text=_dumps(error_result))]
     
     async def _initialize_gmail(self):
-        """Inicializa conexão com Gmail via OAuth"""
+        """Inicializa conexão com Gmail via OAuth
+
+        O fluxo OAuth e o build do service são bloqueantes, então rodam
+        em thread para não travar o event loop.
+        """
         try:
-            creds = None
-            token_path = "credentials/token.pickle"
-            credentials_path = "credentials/credentials.json"
-            
-            # Carrega token salvo se existir
-            if os.path.exists(token_path):
-                with open(token_path, 'rb') as token:
-                    creds = pickle.load(token)
-            
-            # Se não há credenciais válidas, faz autenticação
-            if not creds or not creds.valid:
-                if creds and creds.expired and creds.refresh_token:
-                    creds.refresh(Request())
-                else:
-                    if not os.path.exists(credentials_path):
-                        raise FileNotFoundError(
-                            f"Credenciais não encontradas em {credentials_path}"
-                        )
-                    
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        credentials_path, SCOPES)
-                    creds = flow.run_local_server(port=0)
-                
-                # Salva credenciais
-                os.makedirs(os.path.dirname(token_path), exist_ok=True)
-                with open(token_path, 'wb') as token:
-                    pickle.dump(creds, token)
-            
-            self.service = build('gmail', 'v1', credentials=creds)
-            
+            self.service = await asyncio.to_thread(self._build_gmail_service)
+
         except Exception as e:
             raise Exception(f"Erro ao inicializar Gmail: {e}")
-    
+
+    def _build_gmail_service(self):
+        """Executa o fluxo OAuth (bloqueante) e constrói o service do Gmail"""
+        creds = None
+        token_path = "credentials/token.json"
+        credentials_path = "credentials/credentials.json"
+
+        # Carrega token salvo se existir (JSON: sem os riscos de
+        # execução de código do pickle e carregamento mais rápido)
+        if os.path.exists(token_path):
+            creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+
+        # Se não há credenciais válidas, faz autenticação
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                if not os.path.exists(credentials_path):
+                    raise FileNotFoundError(
+                        f"Credenciais não encontradas em {credentials_path}"
+                    )
+
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    credentials_path, SCOPES)
+                creds = flow.run_local_server(port=0)
+
+            # Salva credenciais
+            os.makedirs(os.path.dirname(token_path), exist_ok=True)
+            with open(token_path, 'w') as token:
+                token.write(creds.to_json())
+
+        # static_discovery=True usa o documento de discovery embutido no
+        # google-api-python-client: nenhum fetch de rede na inicialização
+        return build('gmail', 'v1', credentials=creds, static_discovery=True)
+
     async def _get_recent_emails(self, count: int) -> Dict[str, Any]:
         """Implementação MCP: busca emails recentes"""
         try:
@@ -181,13 +264,10 @@ class GmailMCPServer:
             ).execute()
             
             messages = result.get('messages', [])
-            emails = []
-            
-            for message in messages[:count]:
-                email_data = await self._get_email_details(message['id'])
-                if email_data and 'error' not in email_data:
-                    emails.append(email_data)
-            
+            emails = await self._fetch_messages(
+                [message['id'] for message in messages[:count]]
+            )
+
             return {
                 "tool": "get_recent_emails",
                 "success": True,
@@ -206,15 +286,12 @@ class GmailMCPServer:
             ).execute()
             
             messages = result.get('messages', [])
-            emails = []
-            
-            for message in messages:
-                email_data = await self._get_email_details(message['id'])
-                if email_data and 'error' not in email_data:
-                    emails.append(email_data)
-            
+            emails = await self._fetch_messages(
+                [message['id'] for message in messages]
+            )
+
             return {
-                "tool": "get_unread_emails", 
+                "tool": "get_unread_emails",
                 "success": True,
                 "count": len(emails),
                 "emails": emails
@@ -231,13 +308,10 @@ class GmailMCPServer:
             ).execute()
             
             messages = result.get('messages', [])
-            emails = []
-            
-            for message in messages:
-                email_data = await self._get_email_details(message['id'])
-                if email_data and 'error' not in email_data:
-                    emails.append(email_data)
-            
+            emails = await self._fetch_messages(
+                [message['id'] for message in messages]
+            )
+
             return {
                 "tool": "search_emails",
                 "query": query,
@@ -249,62 +323,137 @@ class GmailMCPServer:
         except Exception as e:
             return {"error": f"Erro na busca '{query}': {e}"}
     
-    async def _get_email_details(self, message_id: str) -> Dict[str, Any]:
-        """Implementação MCP: busca detalhes de um email específico"""
+    async def _fetch_messages(self, message_ids: List[str]) -> List[Dict[str, Any]]:
+        """Busca várias mensagens, em lote quando possível
+
+        Tenta o BatchHttpRequest primeiro; se o batch falhar, cai para
+        buscas individuais concorrentes via asyncio.gather.
+        """
         try:
-            message = self.service.users().messages().get(
-                userId='me', id=message_id
-            ).execute()
-            
-            # Extrair headers
-            headers = {}
-            for header in message['payload'].get('headers', []):
-                name = header['name'].lower()
-                if name in ['from', 'to', 'subject', 'date']:
-                    headers[name] = header['value']
-            
-            # Extrair corpo
-            body = self._extract_body(message['payload'])
-            
-            return {
-                "id": message_id,
-                "thread_id": message['threadId'],
-                "from": headers.get('from', ''),
-                "to": headers.get('to', ''),
-                "subject": headers.get('subject', ''),
-                "date": headers.get('date', ''),
-                "body": body,
-                "snippet": message.get('snippet', ''),
-                "labels": message.get('labelIds', [])
-            }
-            
+            return await self._fetch_messages_batch(message_ids)
+        except Exception:
+            return await self._fetch_messages_concurrent(message_ids)
+
+    async def _fetch_messages_batch(self, message_ids: List[str]) -> List[Dict[str, Any]]:
+        """Busca várias mensagens em lote via BatchHttpRequest
+
+        Agrupa até BATCH_SIZE chamadas messages().get() em uma única
+        requisição HTTP, reduzindo N+1 round trips para ~2.
+        """
+        emails = []
+
+        def _callback(request_id, response, exception):
+            if exception is None and response is not None:
+                emails.append(self._parse_message(response, include_body=False))
+
+        for start in range(0, len(message_ids), BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=_callback)
+            for message_id in message_ids[start:start + BATCH_SIZE]:
+                batch.add(self.service.users().messages().get(
+                    userId='me', id=message_id,
+                    format='metadata', metadataHeaders=METADATA_HEADERS
+                ))
+            await asyncio.to_thread(batch.execute)
+
+        return emails
+
+    async def _fetch_messages_concurrent(self, message_ids: List[str]) -> List[Dict[str, Any]]:
+        """Fallback: busca mensagens individualmente em paralelo
+
+        Sobrepõe as N requisições no event loop com asyncio.gather,
+        limitadas por um semáforo para respeitar o rate limit do Gmail.
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+
+        async def _fetch(message_id: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._get_email_metadata(message_id)
+
+        results = await asyncio.gather(
+            *(_fetch(message_id) for message_id in message_ids),
+            return_exceptions=True
+        )
+
+        return [
+            email for email in results
+            if isinstance(email, dict) and 'error' not in email
+        ]
+
+    async def _get_email_metadata(self, message_id: str) -> Dict[str, Any]:
+        """Implementação MCP: busca apenas os metadados de um email
+
+        Usa format='metadata' para trazer só os headers exibidos nas
+        listagens, sem o corpo em base64 — resposta muito menor.
+        """
+        try:
+            request = self.service.users().messages().get(
+                userId='me', id=message_id,
+                format='metadata', metadataHeaders=METADATA_HEADERS
+            )
+            message = await asyncio.to_thread(request.execute)
+
+            return self._parse_message(message, include_body=False)
+
+        except Exception as e:
+            return {"error": f"Erro ao buscar email {message_id}: {e}"}
+
+    async def _get_email_full(self, message_id: str) -> Dict[str, Any]:
+        """Implementação MCP: busca detalhes completos de um email (com corpo)"""
+        try:
+            request = self.service.users().messages().get(
+                userId='me', id=message_id, format='full'
+            )
+            message = await asyncio.to_thread(request.execute)
+
+            return self._parse_message(message, include_body=True)
+
         except Exception as e:
             return {"error": f"Erro ao buscar email {message_id}: {e}"}
+
+    def _parse_message(self, message: Dict[str, Any], include_body: bool = True) -> Dict[str, Any]:
+        """Extrai headers (e opcionalmente o corpo) de uma mensagem da API"""
+        # Extrair headers
+        headers = {
+            header['name'].lower(): header['value']
+            for header in message['payload'].get('headers', ())
+            if header['name'].lower() in _WANTED_HEADERS
+        }
+
+        email_data = {
+            "id": message['id'],
+            "thread_id": message['threadId'],
+            "from": headers.get('from', ''),
+            "to": headers.get('to', ''),
+            "subject": headers.get('subject', ''),
+            "date": headers.get('date', ''),
+            "snippet": message.get('snippet', ''),
+            "labels": message.get('labelIds', [])
+        }
+
+        # Só extrai o corpo quando a mensagem veio com format='full'
+        if include_body:
+            email_data["body"] = self._extract_body(message['payload'])
+
+        return email_data
     
     def _extract_body(self, payload) -> str:
-        """Extrai corpo do email recursivamente"""
-        body = ""
-        
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    if 'data' in part['body']:
-                        body = base64.urlsafe_b64decode(
-                            part['body']['data']
-                        ).decode('utf-8')
-                        break
-                elif 'parts' in part:
-                    body = self._extract_body(part)
-                    if body:
-                        break
-        else:
-            if payload['mimeType'] == 'text/plain':
-                if 'data' in payload['body']:
-                    body = base64.urlsafe_b64decode(
-                        payload['body']['data']
-                    ).decode('utf-8')
-        
-        return body.strip()
+        """Extrai corpo do email iterativamente (BFS sobre as partes MIME)
+
+        Evita recursão em emails multipart profundos: percorre as partes
+        com uma deque e retorna no primeiro text/plain encontrado.
+        """
+        b64decode = base64.urlsafe_b64decode  # evita lookup por iteração
+
+        parts = deque([payload])
+        while parts:
+            part = parts.popleft()
+
+            if part.get('mimeType') == 'text/plain' and 'data' in part.get('body', {}):
+                return b64decode(part['body']['data']).decode('utf-8').strip()
+
+            parts.extend(part.get('parts', ()))
+
+        return ""
 
 async def main():
     """Função principal que inicia o servidor MCP"""